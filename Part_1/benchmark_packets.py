@@ -0,0 +1,76 @@
+"""
+Benchmark: per-packet notebook loop vs. raw_packets.write_pcap batch path.
+
+    python3 benchmark_packets.py            # 1,000,000 rows
+    python3 benchmark_packets.py --rows 200000
+
+Rows are synthesized by repeating groupAN_http_input.csv. The per-packet
+loop is timed on a sample (--loop-rows) and extrapolated.
+"""
+
+import argparse
+import os
+import struct
+import tempfile
+import time
+
+import pandas as pd
+
+from raw_packets import build_ip_header, build_tcp_header, write_pcap, PCAP_GLOBAL_HEADER
+
+CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'groupAN_http_input.csv')
+
+
+def make_messages(rows: int) -> pd.DataFrame:
+    base = pd.read_csv(CSV_PATH)
+    repeats = -(-rows // len(base))
+    df = pd.concat([base] * repeats, ignore_index=True).iloc[:rows].copy()
+    df['message'] = df['message'] + ' #' + df.index.astype(str)
+    df['timestamp'] = df.index * 0.001
+    return df
+
+
+def per_packet_loop(messages_df: pd.DataFrame, path: str):
+    """The notebook's approach: build and write one packet at a time."""
+    with open(path, 'wb') as f:
+        f.write(PCAP_GLOBAL_HEADER)
+        for row in messages_df.itertuples():
+            payload = str(row.message).encode()
+            packet = (build_ip_header('127.0.0.1', '127.0.0.1', 20 + len(payload))
+                      + build_tcp_header('127.0.0.1', '127.0.0.1', 40000, 12345, payload, flags=0x18)
+                      + payload)
+            frame = struct.pack('<I', 2) + packet
+            f.write(struct.pack('<IIII', 0, 0, len(frame), len(frame)) + frame)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--loop-rows', type=int, default=50_000)
+    args = parser.parse_args()
+
+    df = make_messages(args.rows)
+    out = os.path.join(tempfile.gettempdir(), 'raw_packets_bench.pcap')
+
+    sample = df.iloc[:min(args.loop_rows, args.rows)]
+    start = time.perf_counter()
+    per_packet_loop(sample, out)
+    loop_rate = len(sample) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    write_pcap(df, out)
+    batch_seconds = time.perf_counter() - start
+    batch_rate = args.rows / batch_seconds
+
+    size_mb = os.path.getsize(out) / 1e6
+    os.remove(out)
+
+    print(f"rows:            {args.rows:,}")
+    print(f"per-packet loop: {loop_rate:,.0f} packets/s "
+          f"(~{args.rows / loop_rate:.1f}s extrapolated, {len(sample):,}-row sample)")
+    print(f"batch (NumPy):   {batch_rate:,.0f} packets/s ({batch_seconds:.2f}s, {size_mb:.0f} MB pcap)")
+    print(f"speedup:         {batch_rate / loop_rate:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
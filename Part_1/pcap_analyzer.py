@@ -0,0 +1,589 @@
+"""
+Streaming pcap analyzer for chat-server captures.
+
+    python3 pcap_analyzer.py capture.pcap
+    python3 pcap_analyzer.py big_capture.pcap --json > flows.jsonl
+
+The file is memory-mapped and read in one pass: records are sliced as
+memoryviews (no copies), Ethernet / loopback / raw IPv4 + TCP headers are
+decoded with the layouts from raw_packets.py, and each TCP stream is
+reassembled just far enough to recognise the HTTP upgrade and the
+WebSocket frames produced by the ChatApp server. Memory depends on the
+number of open connections, not on the capture size: a flow's stats are
+printed and dropped as soon as it closes, or once it has seen no packets
+for --idle-timeout seconds of capture time (lost FIN, SYN-only flows).
+
+Per flow: handshake RTT, retransmissions, RSTs, HTTP requests, WebSocket
+frames and chat message latency (client frame -> the server's broadcast
+of the same text).
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import socket
+import struct
+import sys
+from collections import OrderedDict
+
+from raw_packets import IP_HEADER, TCP_HEADER
+
+# pcap magics (as read little-endian) -> (byte order, timestamp divisor)
+PCAP_MAGICS = {
+    0xa1b2c3d4: ('<', 1e6),
+    0xd4c3b2a1: ('>', 1e6),
+    0xa1b23c4d: ('<', 1e9),
+    0x4d3cb2a1: ('>', 1e9),
+}
+PCAPNG_MAGIC = 0x0a0d0d0a
+
+# Link types
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_VLAN = (0x8100, 0x88a8)
+
+# TCP flags
+FIN, SYN, RST, PSH, ACK = 0x01, 0x02, 0x04, 0x08, 0x10
+
+# Bounds that keep memory constant
+MAX_HTTP_HEADER = 64 * 1024      # bytes buffered while looking for \r\n\r\n
+MAX_OUT_OF_ORDER = 32            # segments held per direction waiting for a gap
+MAX_KEPT_PAYLOAD = 4096          # WebSocket payloads hashed for latency matching
+MAX_PENDING_MESSAGES = 10000     # client messages waiting for their broadcast
+MAX_RECENTLY_CLOSED = 4096       # closed flows whose stray ACK/RSTs are ignored
+
+DEFAULT_IDLE_TIMEOUT = 300.0     # capture seconds without packets before a flow is dropped
+
+
+def seq_before(a, b):
+    """TCP sequence comparison a < b (mod 2**32)."""
+    return 0 < ((b - a) & 0xFFFFFFFF) < 0x80000000
+
+
+# --- pcap reading ----------------------------------------------------------
+
+def iter_packets(buffer):
+    """
+    Iterate pcap records over a buffer (normally an mmap).
+
+    Yields:
+        (timestamp, link_type, memoryview of the captured bytes)
+    """
+    if len(buffer) < 24:
+        raise ValueError("file too short for a pcap header")
+    magic = struct.unpack_from('<I', buffer, 0)[0]
+    if magic == PCAPNG_MAGIC:
+        raise ValueError("pcapng is not supported; save the capture as 'Wireshark/tcpdump - pcap'")
+    if magic not in PCAP_MAGICS:
+        raise ValueError("not a pcap file")
+
+    order, divisor = PCAP_MAGICS[magic]
+    link_type = struct.unpack_from(order + 'I', buffer, 20)[0] & 0x0FFFFFFF
+    record = struct.Struct(order + 'IIII')
+
+    view = memoryview(buffer)
+    offset = 24
+    end = len(buffer)
+    try:
+        while offset + record.size <= end:
+            ts_sec, ts_frac, captured, _ = record.unpack_from(buffer, offset)
+            offset += record.size
+            if offset + captured > end:
+                break  # truncated last record
+            yield ts_sec + ts_frac / divisor, link_type, view[offset:offset + captured]
+            offset += captured
+    finally:
+        # Let the caller close the mmap
+        view.release()
+
+
+def ip_offset(link_type, frame):
+    """Offset of the IPv4 header in a frame, or None if it isn't IPv4."""
+    if link_type == LINKTYPE_ETHERNET:
+        offset, ethertype = 14, None
+        if len(frame) >= 14:
+            ethertype = struct.unpack_from('!H', frame, 12)[0]
+            while ethertype in ETHERTYPE_VLAN and len(frame) >= offset + 4:
+                ethertype = struct.unpack_from('!H', frame, offset + 2)[0]
+                offset += 4
+        return offset if ethertype == ETHERTYPE_IPV4 else None
+    if link_type == LINKTYPE_NULL:
+        # Address family is in the capturing host's byte order
+        if len(frame) >= 4 and frame[0] | frame[3] == socket.AF_INET:
+            return 4
+        return None
+    if link_type == LINKTYPE_LINUX_SLL:
+        if len(frame) >= 16 and struct.unpack_from('!H', frame, 14)[0] == ETHERTYPE_IPV4:
+            return 16
+        return None
+    if link_type in (LINKTYPE_RAW, LINKTYPE_IPV4):
+        return 0
+    return None
+
+
+def decode_tcp(link_type, frame):
+    """
+    Decode IPv4 + TCP headers from a link-layer frame.
+
+    Returns:
+        (src, dst, sport, dport, seq, ack, flags, payload memoryview)
+        or None for anything that isn't an unfragmented IPv4 TCP segment
+    """
+    offset = ip_offset(link_type, frame)
+    if offset is None or len(frame) < offset + IP_HEADER.size:
+        return None
+
+    (version_ihl, _, total_length, _, frag, _, proto, _,
+     src, dst) = IP_HEADER.unpack_from(frame, offset)
+    if version_ihl >> 4 != 4 or proto != socket.IPPROTO_TCP or frag & 0x1FFF:
+        return None
+
+    tcp_offset = offset + (version_ihl & 0x0F) * 4
+    if len(frame) < tcp_offset + TCP_HEADER.size:
+        return None
+    sport, dport, seq, ack, data_offset, flags, _, _, _ = TCP_HEADER.unpack_from(frame, tcp_offset)
+
+    payload_start = tcp_offset + (data_offset >> 4) * 4
+    # Ethernet pads short frames; trust the IP length
+    payload_end = min(len(frame), offset + total_length)
+    payload = frame[payload_start:payload_end] if payload_end > payload_start else frame[0:0]
+    return (socket.inet_ntoa(src), socket.inet_ntoa(dst), sport, dport,
+            seq, ack, flags, payload)
+
+
+# --- stream reassembly + protocol parsing ----------------------------------
+
+class Direction:
+    """One side of a TCP connection: reassembly and HTTP/WebSocket parsing."""
+
+    def __init__(self, flow, from_client):
+        self.flow = flow
+        self.from_client = from_client
+        self.next_seq = None       # next in-order byte we expect
+        self.out_of_order = {}     # {seq: bytes}
+        self.buffer = bytearray()  # unparsed in-order bytes
+        self.skip = 0              # payload bytes to drop (HTTP body, large WS frame)
+        self.mode = 'http'         # 'http' | 'ws' | 'lost'
+        self.frame_ts = 0.0        # when the first byte in buffer arrived
+
+    def segment(self, ts, seq, flags, payload):
+        """Handle one TCP segment travelling in this direction."""
+        length = len(payload)
+        if flags & SYN:
+            self.next_seq = (seq + 1) & 0xFFFFFFFF
+            return
+        if length == 0:
+            return
+
+        end = (seq + length) & 0xFFFFFFFF
+        if self.next_seq is None:
+            # Capture started mid-stream
+            self.next_seq = seq
+
+        if seq == self.next_seq:
+            self.feed(ts, payload)
+            self.next_seq = end
+            self.drain_out_of_order(ts)
+        elif seq_before(self.next_seq, seq):
+            # Ahead of a gap: reordered (or lost) data, unless we already hold it
+            if seq in self.out_of_order:
+                self.flow.retransmits += 1
+            elif len(self.out_of_order) < MAX_OUT_OF_ORDER:
+                self.out_of_order[seq] = bytes(payload)
+            else:
+                self.lose_sync()
+        else:
+            # Starts at bytes already delivered
+            self.flow.retransmits += 1
+            if seq_before(self.next_seq, end):
+                # Partial overlap: keep only the new tail
+                self.feed(ts, payload[(self.next_seq - seq) & 0xFFFFFFFF:])
+                self.next_seq = end
+                self.drain_out_of_order(ts)
+
+    def drain_out_of_order(self, ts):
+        while self.next_seq in self.out_of_order:
+            data = self.out_of_order.pop(self.next_seq)
+            self.feed(ts, data)
+            self.next_seq = (self.next_seq + len(data)) & 0xFFFFFFFF
+
+    def lose_sync(self):
+        """Too much missing data: stop parsing this direction."""
+        self.mode = 'lost'
+        self.out_of_order.clear()
+        self.buffer.clear()
+        self.flow.gaps += 1
+
+    def feed(self, ts, data):
+        """Parse newly in-order bytes (copied only if they must be buffered)."""
+        if self.mode == 'lost':
+            return
+        if self.skip:
+            dropped = min(self.skip, len(data))
+            self.skip -= dropped
+            data = data[dropped:]
+        if not data:
+            return
+        if not self.buffer:
+            self.frame_ts = ts
+        self.buffer += data
+        if self.mode == 'http':
+            self.parse_http(ts)
+        if self.mode == 'ws':
+            self.parse_ws(ts)
+
+    def parse_http(self, ts):
+        while self.mode == 'http' and self.buffer:
+            end = self.buffer.find(b'\r\n\r\n')
+            if end < 0:
+                if len(self.buffer) > MAX_HTTP_HEADER:
+                    self.lose_sync()
+                return
+
+            head = bytes(self.buffer[:end]).decode('latin-1')
+            del self.buffer[:end + 4]
+            # Whatever follows arrived in this segment
+            self.frame_ts = ts
+            lines = head.split('\r\n')
+            headers = {}
+            for line in lines[1:]:
+                key, _, value = line.partition(':')
+                headers[key.strip().lower()] = value.strip().lower()
+
+            if self.from_client:
+                self.flow.http_requests += 1
+                if 'websocket' in headers.get('upgrade', ''):
+                    self.flow.upgrade_requested = True
+                    self.flow.upgrade_request_ts = ts
+            else:
+                status = lines[0].split(' ')
+                if len(status) > 1 and status[1] == '101' and self.flow.upgrade_requested:
+                    self.flow.websocket = True
+                    if self.flow.upgrade_request_ts is not None:
+                        self.flow.upgrade_latency = ts - self.flow.upgrade_request_ts
+                    self.mode = 'ws'
+                    self.flow.client_side.mode = 'ws'
+                    self.flow.client_side.parse_ws(ts)
+                    return
+                self.flow.http_responses += 1
+                try:
+                    self.skip = int(headers.get('content-length', '0'))
+                except ValueError:
+                    self.skip = 0
+                # Body bytes already buffered count against skip
+                dropped = min(self.skip, len(self.buffer))
+                del self.buffer[:dropped]
+                self.skip -= dropped
+
+    def parse_ws(self, ts):
+        buf = self.buffer
+        while len(buf) >= 2:
+            opcode = buf[0] & 0x0F
+            masked = buf[1] & 0x80
+            length = buf[1] & 0x7F
+            header = 2
+            if length == 126:
+                if len(buf) < 4:
+                    return
+                length = struct.unpack_from('!H', buf, 2)[0]
+                header = 4
+            elif length == 127:
+                if len(buf) < 10:
+                    return
+                length = struct.unpack_from('!Q', buf, 2)[0]
+                header = 10
+            if masked:
+                header += 4
+
+            if length > MAX_KEPT_PAYLOAD:
+                # Count it, then skip the payload without buffering it
+                if len(buf) < header:
+                    return
+                self.flow.ws_frame(self.from_client, opcode, None, self.frame_ts, ts)
+                available = len(buf) - header
+                del buf[:header + min(available, length)]
+                self.skip = max(0, length - available)
+                if self.skip:
+                    return
+                continue
+
+            if len(buf) < header + length:
+                return
+            payload = bytes(buf[header:header + length])
+            if masked:
+                mask = buf[header - 4:header]
+                payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+            del buf[:header + length]
+            self.flow.ws_frame(self.from_client, opcode, payload, self.frame_ts, ts)
+            # The next frame (if any) started in this segment
+            self.frame_ts = ts
+
+
+class Flow:
+    """Statistics for one TCP connection."""
+
+    def __init__(self, analyzer, client, server, ts):
+        self.analyzer = analyzer
+        self.client = client
+        self.server = server
+        self.start = ts
+        self.last = ts
+        self.packets = 0
+        self.bytes = 0
+        self.syn_ts = None
+        self.synack_ts = None
+        self.handshake_rtt = None
+        self.retransmits = 0
+        self.rsts = 0
+        self.gaps = 0
+        self.fins = set()
+        self.http_requests = 0
+        self.http_responses = 0
+        self.upgrade_requested = False
+        self.upgrade_request_ts = None
+        self.upgrade_latency = None
+        self.websocket = False
+        self.ws_frames = {'client': 0, 'server': 0}
+        self.ws_text_messages = 0
+        self.latency_count = 0
+        self.latency_total = 0.0
+        self.latency_max = None
+        self.timed_out = False
+        self.client_side = Direction(self, True)
+        self.server_side = Direction(self, False)
+
+    def packet(self, ts, from_client, seq, flags, payload):
+        self.packets += 1
+        self.bytes += len(payload)
+        self.last = ts
+
+        if flags & SYN and not flags & ACK:
+            if self.syn_ts is not None:
+                self.retransmits += 1  # SYN retransmission
+            self.syn_ts = ts
+        elif flags & SYN and flags & ACK:
+            self.synack_ts = ts
+            if self.syn_ts is not None and self.handshake_rtt is None:
+                self.handshake_rtt = ts - self.syn_ts
+        if flags & RST:
+            self.rsts += 1
+        if flags & FIN:
+            self.fins.add(from_client)
+
+        side = self.client_side if from_client else self.server_side
+        side.segment(ts, seq, flags, payload)
+
+    def add_latency(self, latency):
+        self.latency_count += 1
+        self.latency_total += latency
+        if self.latency_max is None or latency > self.latency_max:
+            self.latency_max = latency
+
+    def ws_frame(self, from_client, opcode, payload, start_ts, end_ts):
+        """
+        A WebSocket frame was parsed. Latency runs from the first byte of
+        the client's frame (start_ts) to the last byte of the server's
+        broadcast of the same text (end_ts).
+        """
+        self.ws_frames['client' if from_client else 'server'] += 1
+        if opcode != 0x1 or payload is None:
+            return
+        digest = hashlib.blake2b(payload, digest_size=8).digest()
+        if from_client:
+            self.ws_text_messages += 1
+            self.analyzer.message_sent(digest, self, start_ts)
+        else:
+            self.analyzer.message_delivered(digest, end_ts)
+
+    @property
+    def closed(self):
+        return self.rsts > 0 or len(self.fins) == 2
+
+    def summary(self):
+        def ms(value):
+            return None if value is None else round(value * 1000, 3)
+
+        average = self.latency_total / self.latency_count if self.latency_count else None
+        return {
+            'client': f"{self.client[0]}:{self.client[1]}",
+            'server': f"{self.server[0]}:{self.server[1]}",
+            'start': round(self.start, 6),
+            'duration_ms': ms(self.last - self.start),
+            'packets': self.packets,
+            'payload_bytes': self.bytes,
+            'handshake_rtt_ms': ms(self.handshake_rtt),
+            'retransmits': self.retransmits,
+            'rsts': self.rsts,
+            'gaps': self.gaps,
+            'timed_out': self.timed_out,
+            'http_requests': self.http_requests,
+            'http_responses': self.http_responses,
+            'websocket': self.websocket,
+            'upgrade_ms': ms(self.upgrade_latency),
+            'ws_frames_client': self.ws_frames['client'],
+            'ws_frames_server': self.ws_frames['server'],
+            'messages': self.ws_text_messages,
+            'latency_avg_ms': ms(average),
+            'latency_max_ms': ms(self.latency_max),
+        }
+
+
+class Analyzer:
+    """Single-pass analyzer: feed packets, get flow summaries as they close."""
+
+    def __init__(self, on_flow, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.on_flow = on_flow
+        self.idle_timeout = idle_timeout
+        self.flows = OrderedDict()  # {(endpoint, endpoint) sorted: Flow}, least recently active first
+        self.recently_closed = OrderedDict()  # {key: None}
+        self.pending = OrderedDict()  # {digest: (Flow, ts)} awaiting broadcast
+        self.packets = 0
+        self.tcp_packets = 0
+        self.flow_count = 0
+
+    def packet(self, ts, link_type, frame):
+        self.packets += 1
+        decoded = decode_tcp(link_type, frame)
+        if decoded is None:
+            return
+        self.tcp_packets += 1
+        src, dst, sport, dport, seq, _, flags, payload = decoded
+        self.expire_idle(ts)
+
+        a, b = (src, sport), (dst, dport)
+        key = (a, b) if a < b else (b, a)
+        new_connection = flags & SYN and not flags & ACK
+        if key in self.recently_closed:
+            if not new_connection:
+                return  # late ACK/RST of a connection already reported
+            del self.recently_closed[key]
+
+        flow = self.flows.get(key)
+        if flow is None or (flow.closed and new_connection):
+            if flow is not None:
+                self.finish(key)
+            # The SYN sender is the client; mid-stream, guess the higher port
+            if new_connection:
+                client, server = a, b
+            elif flags & SYN:
+                client, server = b, a
+            else:
+                client, server = (a, b) if sport > dport else (b, a)
+            flow = self.flows[key] = Flow(self, client, server, ts)
+        else:
+            self.flows.move_to_end(key)
+
+        flow.packet(ts, a == flow.client, seq, flags, payload)
+        if flow.closed and not payload and flags & (RST | ACK) and (
+                flags & RST or not flags & FIN):
+            # Final ACK after both FINs, or a RST: the flow is done
+            self.finish(key)
+
+    def finish(self, key, timed_out=False):
+        flow = self.flows.pop(key)
+        self.flow_count += 1
+        if timed_out:
+            # Not closed: later packets start a new (mid-stream) flow
+            flow.timed_out = True
+        else:
+            self.recently_closed[key] = None
+            if len(self.recently_closed) > MAX_RECENTLY_CLOSED:
+                self.recently_closed.popitem(last=False)
+        self.on_flow(flow.summary())
+
+    def expire_idle(self, ts):
+        """Report and drop flows with no packets for idle_timeout (capture time)."""
+        while self.flows:
+            key, flow = next(iter(self.flows.items()))
+            if ts - flow.last < self.idle_timeout:
+                return
+            self.finish(key, timed_out=True)
+
+    def finish_all(self):
+        for key in list(self.flows):
+            self.finish(key)
+
+    def message_sent(self, digest, flow, ts):
+        if digest not in self.pending:
+            self.pending[digest] = (flow, ts)
+            if len(self.pending) > MAX_PENDING_MESSAGES:
+                self.pending.popitem(last=False)
+
+    def message_delivered(self, digest, ts):
+        entry = self.pending.pop(digest, None)
+        if entry is not None:
+            flow, sent_ts = entry
+            flow.add_latency(ts - sent_ts)
+
+
+def analyze(path, on_flow, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+    """
+    Analyze a pcap file in one pass over a memory map.
+
+    Args:
+        path: pcap file path
+        on_flow: Callback(summary_dict) called when each flow closes
+        idle_timeout: Capture seconds without packets before a flow is
+            reported and dropped
+
+    Returns:
+        The Analyzer (for totals)
+    """
+    analyzer = Analyzer(on_flow, idle_timeout)
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for ts, link_type, frame in iter_packets(mapped):
+                analyzer.packet(ts, link_type, frame)
+                frame.release()
+            analyzer.finish_all()
+        finally:
+            try:
+                mapped.close()
+            except BufferError:
+                pass  # a view is still alive after an error; the GC unmaps it
+    return analyzer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-flow stats for a chat-server pcap")
+    parser.add_argument('pcap')
+    parser.add_argument('--json', action='store_true', help="one JSON object per flow")
+    parser.add_argument('--idle-timeout', type=float, default=DEFAULT_IDLE_TIMEOUT, metavar='SECONDS',
+                        help=f"report flows idle this long in capture time (default {DEFAULT_IDLE_TIMEOUT:g})")
+    args = parser.parse_args()
+
+    columns = ('client', 'server', 'packets', 'handshake_rtt_ms', 'retransmits', 'rsts',
+               'http_requests', 'websocket', 'messages', 'latency_avg_ms', 'latency_max_ms')
+
+    if args.json:
+        def on_flow(summary):
+            print(json.dumps(summary))
+    else:
+        print('\t'.join(columns))
+
+        def on_flow(summary):
+            print('\t'.join('-' if summary[c] is None else str(summary[c]) for c in columns))
+
+    try:
+        analyzer = analyze(args.pcap, on_flow, args.idle_timeout)
+    except BrokenPipeError:
+        # Output piped into head etc.
+        sys.stderr.close()
+        sys.exit(0)
+    except (OSError, ValueError) as e:
+        print(f"[-] {args.pcap}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"# {analyzer.packets} packets, {analyzer.tcp_packets} TCP, "
+          f"{analyzer.flow_count} flows", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+Raw IPv4/TCP packet building, extracted from
+raw_tcp_ip_notebook_fallback_annotated-v1.ipynb so it can be imported.
+
+Single packets:  build_ip_header / build_tcp_header (same as the notebook)
+Whole CSV:       write_pcap(messages_df, "out.pcap")
+
+The batch path builds every header for a chunk of rows at once with NumPy
+(including the Internet checksums) into one preallocated buffer per chunk
+and writes it straight to a pcap file, instead of packing and checksumming
+packet by packet.
+"""
+
+import os
+import random
+import socket
+import struct
+import time
+from typing import Optional
+
+import numpy as np
+
+# Header layouts (no options): shared with pcap_analyzer.py
+IP_HEADER = struct.Struct('!BBHHHBBH4s4s')   # ver/ihl, tos, len, id, frag, ttl, proto, csum, src, dst
+TCP_HEADER = struct.Struct('!HHLLBBHHH')     # sport, dport, seq, ack, offset, flags, window, csum, urg
+PSEUDO_HEADER = struct.Struct('!4s4sBBH')    # src, dst, zero, proto, tcp length
+
+# pcap file header: magic, v2.4, tz, sigfigs, snaplen, linktype
+LINKTYPE_NULL = 0  # BSD loopback, like capture.pcap (4-byte family + IPv4)
+PCAP_GLOBAL_HEADER = struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 65535, LINKTYPE_NULL)
+
+# Per-packet layout in the batch buffer
+PCAP_RECORD_LEN = 16  # ts_sec, ts_usec, incl_len, orig_len
+NULL_HEADER_LEN = 4   # address family (host byte order)
+IP_HEADER_LEN = 20
+TCP_HEADER_LEN = 20
+HEADER_LEN = PCAP_RECORD_LEN + NULL_HEADER_LEN + IP_HEADER_LEN + TCP_HEADER_LEN
+
+# Offsets of the IP / TCP headers inside one packet's header block
+IP_OFFSET = PCAP_RECORD_LEN + NULL_HEADER_LEN
+TCP_OFFSET = IP_OFFSET + IP_HEADER_LEN
+
+# Largest payload that fits the 16-bit IPv4 total length and the 65535
+# snaplen (the batch path does not segment)
+MAX_PAYLOAD_LEN = 65535 - NULL_HEADER_LEN - IP_HEADER_LEN - TCP_HEADER_LEN
+
+DEFAULT_CHUNK_ROWS = 65536
+
+
+# --- single packet (notebook API) ------------------------------------------
+
+def checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b'\0'
+    res = sum(struct.unpack('!%dH' % (len(data)//2), data))
+    while res >> 16:
+        res = (res & 0xFFFF) + (res >> 16)
+    return ~res & 0xFFFF
+
+
+def hexdump(data: bytes, width: int=16):
+    for i in range(0, len(data), width):
+        chunk = data[i:i+width]
+        hex_bytes = ' '.join(f'{b:02x}' for b in chunk)
+        ascii_bytes = ''.join(chr(b) if 32 <= b < 127 else '.' for b in chunk)
+        print(f"{i:04x}  {hex_bytes:<{width*3}}  {ascii_bytes}")
+
+
+def build_ip_header(src_ip: str, dst_ip: str, payload_len: int, proto: int=socket.IPPROTO_TCP) -> bytes:
+    version_ihl = (4 << 4) + 5
+    tos = 0
+    total_length = 20 + payload_len
+    identification = random.randint(0, 65535)
+    flags_fragment = 0
+    ttl = 64
+    ip_header = bytearray(IP_HEADER.pack(version_ihl, tos, total_length, identification,
+                                         flags_fragment, ttl, proto, 0,
+                                         socket.inet_aton(src_ip), socket.inet_aton(dst_ip)))
+    # Pack once, then patch the checksum field in place
+    struct.pack_into('!H', ip_header, 10, checksum(bytes(ip_header)))
+    return bytes(ip_header)
+
+
+def build_tcp_header(src_ip: str, dst_ip: str, src_port: int, dst_port: int, payload: bytes=b'',
+                     seq: Optional[int]=None, ack_seq: int=0, flags: int=0x02, window: int=65535) -> bytes:
+    if seq is None:
+        seq = random.randint(0, 0xFFFFFFFF)
+    doff_reserved = (5 << 4)
+    urg_ptr = 0
+    tcp_header = bytearray(TCP_HEADER.pack(src_port, dst_port, seq, ack_seq,
+                                           doff_reserved, flags, window,
+                                           0, urg_ptr))
+    tcp_length = len(tcp_header) + len(payload)
+    pseudo_header = PSEUDO_HEADER.pack(socket.inet_aton(src_ip), socket.inet_aton(dst_ip),
+                                       0, socket.IPPROTO_TCP, tcp_length)
+    struct.pack_into('!H', tcp_header, 16, checksum(pseudo_header + bytes(tcp_header) + payload))
+    return bytes(tcp_header)
+
+
+# --- batch (NumPy) ---------------------------------------------------------
+
+def _fold_checksum(total: np.ndarray) -> np.ndarray:
+    """Fold 32/64-bit word sums to 16 bits and complement (vectorized)."""
+    total = total.astype(np.uint64)
+    while np.any(total >> 16):
+        total = (total & 0xFFFF) + (total >> 16)
+    return (~total) & 0xFFFF
+
+
+def _word_sums(block: np.ndarray) -> np.ndarray:
+    """Sum the big-endian 16-bit words of each row of an (N, even) uint8 array."""
+    words = block.reshape(len(block), -1, 2).astype(np.uint32)
+    return (words[:, :, 0] << 8 | words[:, :, 1]).sum(axis=1, dtype=np.uint64)
+
+
+def _payload_word_sums(payload: np.ndarray, starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """
+    Sum each packet's payload as big-endian 16-bit words (odd tail padded
+    with zero), for all packets at once over their concatenated bytes.
+    """
+    sums = np.zeros(len(lengths), dtype=np.uint64)
+    if len(payload) == 0:
+        return sums
+
+    # Even positions within a packet are the high byte of a word
+    position = np.arange(len(payload), dtype=np.int64) - np.repeat(starts, lengths)
+    weighted = payload.astype(np.uint64) << ((1 - (position & 1)) * 8).astype(np.uint64)
+
+    nonempty = lengths > 0
+    sums[nonempty] = np.add.reduceat(weighted, starts[nonempty])
+    return sums
+
+
+def _be16(block: np.ndarray, column: int, values: np.ndarray):
+    block[:, column] = (values >> 8) & 0xFF
+    block[:, column + 1] = values & 0xFF
+
+
+def _be32(block: np.ndarray, column: int, values: np.ndarray):
+    for i, shift in enumerate((24, 16, 8, 0)):
+        block[:, column + i] = (values >> shift) & 0xFF
+
+
+def _le32(block: np.ndarray, column: int, values: np.ndarray):
+    for i, shift in enumerate((0, 8, 16, 24)):
+        block[:, column + i] = (values >> shift) & 0xFF
+
+
+def build_packet_chunk(payloads, timestamps, src_ip: str, dst_ip: str,
+                       src_port: int, dst_port: int, first_seq: int,
+                       flags: int=0x18, window: int=65535, base_time: float=0.0,
+                       rng: Optional[np.random.Generator]=None) -> bytes:
+    """
+    Build pcap records (record header + loopback header + IPv4 + TCP +
+    payload) for a list of payloads in one preallocated buffer.
+
+    Sequence numbers are contiguous starting at first_seq, as on a real
+    stream; IP identification is random per packet like build_ip_header.
+
+    Returns:
+        The records as one bytes object, ready to append to a pcap file
+
+    Raises:
+        ValueError: If a payload is longer than MAX_PAYLOAD_LEN
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    count = len(payloads)
+    if count == 0:
+        return b''
+    lengths = np.fromiter((len(p) for p in payloads), dtype=np.int64, count=count)
+    too_long = np.flatnonzero(lengths > MAX_PAYLOAD_LEN)
+    if len(too_long):
+        index = int(too_long[0])
+        raise ValueError(f"payload {index} is {lengths[index]} bytes; "
+                         f"at most {MAX_PAYLOAD_LEN} fit in one packet")
+    payload = np.frombuffer(b''.join(payloads), dtype=np.uint8)
+    payload_starts = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64)
+
+    # Constant fields come from one packed template row
+    template = np.frombuffer(
+        struct.pack('<IIII', 0, 0, 0, 0)
+        + struct.pack('<I', socket.AF_INET)
+        + IP_HEADER.pack(0x45, 0, 0, 0, 0, 64, socket.IPPROTO_TCP, 0,
+                         socket.inet_aton(src_ip), socket.inet_aton(dst_ip))
+        + TCP_HEADER.pack(src_port, dst_port, 0, 0, 5 << 4, flags, window, 0, 0),
+        dtype=np.uint8)
+    headers = np.empty((count, HEADER_LEN), dtype=np.uint8)
+    headers[:] = template
+
+    # pcap record header
+    timestamps = np.asarray(timestamps, dtype=np.float64) + base_time
+    seconds = np.floor(timestamps).astype(np.int64)
+    micros = np.minimum(np.round((timestamps - seconds) * 1e6), 999999).astype(np.int64)
+    captured = lengths + (NULL_HEADER_LEN + IP_HEADER_LEN + TCP_HEADER_LEN)
+    _le32(headers, 0, seconds)
+    _le32(headers, 4, micros)
+    _le32(headers, 8, captured)
+    _le32(headers, 12, captured)
+
+    # IPv4: total length, identification, then checksum over the finished header
+    _be16(headers, IP_OFFSET + 2, lengths + IP_HEADER_LEN + TCP_HEADER_LEN)
+    _be16(headers, IP_OFFSET + 4, rng.integers(0, 65536, size=count, dtype=np.int64))
+    ip_sum = _fold_checksum(_word_sums(headers[:, IP_OFFSET:IP_OFFSET + IP_HEADER_LEN]))
+    _be16(headers, IP_OFFSET + 10, ip_sum.astype(np.int64))
+
+    # TCP: sequence numbers, then checksum over pseudo header + header + payload
+    seqs = (first_seq + payload_starts) & 0xFFFFFFFF
+    _be32(headers, TCP_OFFSET + 4, seqs)
+    pseudo = _word_sums(headers[:, IP_OFFSET + 12:IP_OFFSET + 20])  # src + dst address
+    pseudo += socket.IPPROTO_TCP + (lengths + TCP_HEADER_LEN).astype(np.uint64)
+    tcp_total = (pseudo
+                 + _word_sums(headers[:, TCP_OFFSET:TCP_OFFSET + TCP_HEADER_LEN])
+                 + _payload_word_sums(payload, payload_starts, lengths))
+    _be16(headers, TCP_OFFSET + 16, _fold_checksum(tcp_total).astype(np.int64))
+
+    # Interleave header blocks and payloads into one output buffer
+    record_lengths = lengths + HEADER_LEN
+    record_starts = np.concatenate(([0], np.cumsum(record_lengths)[:-1])).astype(np.int64)
+    out = np.empty(int(record_lengths.sum()), dtype=np.uint8)
+    out[(record_starts[:, None] + np.arange(HEADER_LEN)).ravel()] = headers.ravel()
+    if len(payload):
+        shift = np.repeat(record_starts + HEADER_LEN - payload_starts, lengths)
+        out[np.arange(len(payload), dtype=np.int64) + shift] = payload
+    return out.tobytes()
+
+
+def write_pcap(messages_df, path: str, src_ip: str='127.0.0.1', dst_ip: str='127.0.0.1',
+               src_port: Optional[int]=None, dst_port: int=12345, flags: int=0x18,
+               seq: Optional[int]=None, base_time: Optional[float]=None,
+               chunk_rows: int=DEFAULT_CHUNK_ROWS) -> int:
+    """
+    Encapsulate every row of messages_df (the notebook's CSV DataFrame) as
+    an IPv4/TCP packet and write them all to a pcap file.
+
+    The 'message' column is the payload (UTF-8; missing values are empty);
+    the 'timestamp' column (seconds) is added to base_time for the capture
+    time. Rows are processed chunk_rows at a time, so memory stays bounded
+    for multi-million-row inputs.
+
+    Returns:
+        Number of packets written
+
+    Raises:
+        ValueError: If a message is longer than MAX_PAYLOAD_LEN bytes
+            (UTF-8); no file is left behind
+    """
+    if src_port is None:
+        src_port = random.randint(1024, 65535)
+    if seq is None:
+        seq = random.randint(0, 0xFFFFFFFF)
+    if base_time is None:
+        base_time = time.time()
+
+    rng = np.random.default_rng()
+    messages = messages_df['message'].fillna('').astype(str).tolist()
+    timestamps = messages_df['timestamp'].to_numpy(dtype=np.float64)
+
+    with open(path, 'wb') as f:
+        f.write(PCAP_GLOBAL_HEADER)
+        try:
+            for start in range(0, len(messages), chunk_rows):
+                payloads = [m.encode('utf-8') for m in messages[start:start + chunk_rows]]
+                lengths = [len(p) for p in payloads]
+                longest = max(lengths)
+                if longest > MAX_PAYLOAD_LEN:
+                    row = start + lengths.index(longest)
+                    raise ValueError(f"row {row}: message is {longest} bytes; "
+                                     f"at most {MAX_PAYLOAD_LEN} fit in one packet")
+                f.write(build_packet_chunk(payloads, timestamps[start:start + chunk_rows],
+                                           src_ip, dst_ip, src_port, dst_port, seq,
+                                           flags=flags, base_time=base_time, rng=rng))
+                seq = (seq + sum(lengths)) & 0xFFFFFFFF
+        except ValueError:
+            f.close()
+            os.remove(path)
+            raise
+
+    return len(messages)
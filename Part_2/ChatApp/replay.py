@@ -0,0 +1,408 @@
+"""
+Replay tool for traffic recorded with `python3 run.py --record FILE`.
+Run this from the ChatApp directory.
+
+    python3 replay.py run traffic.rec --speed 10 --copies 100
+    python3 replay.py pcap traffic.rec traffic.pcap
+
+`run` reproduces the recorded inbound frames against a server, one
+virtual client per recorded connection (times --copies), at the recorded
+pace divided by --speed (0 = as fast as possible). All virtual clients
+share one thread and a selector, so thousands of them are cheap.
+
+`pcap` writes the recorded conversation as a Wireshark-readable capture
+(loopback link type, like Part_1/capture.pcap).
+"""
+
+import argparse
+import base64
+import hashlib
+import os
+import selectors
+import socket
+import struct
+import sys
+import time
+
+# Add server directory to path
+server_dir = os.path.join(os.path.dirname(__file__), 'server')
+sys.path.insert(0, server_dir)
+
+from recorder import read_recording, KIND_OPEN, KIND_CLOSE, FLAG_FIN
+from websocket_handler import unmask_payload, WEBSOCKET_GUID
+
+HANDSHAKE_KEY = "dGhlIHNhbXBsZSBub25jZQ=="
+
+# Seconds of silence after the last event before leftover clients are closed
+DEFAULT_IDLE_TIMEOUT = 5.0
+
+
+def build_upgrade_request(host, port):
+    """HTTP upgrade request sent by every virtual client."""
+    return (
+        f"GET / HTTP/1.1\r\n"
+        f"Host: {host}:{port}\r\n"
+        "Upgrade: websocket\r\n"
+        "Connection: Upgrade\r\n"
+        f"Sec-WebSocket-Key: {HANDSHAKE_KEY}\r\n"
+        "Sec-WebSocket-Version: 13\r\n"
+        "\r\n"
+    ).encode()
+
+
+def encode_client_frame(payload, opcode, mask_key=None, flags=FLAG_FIN):
+    """
+    Encode a client -> server frame (always masked, RFC 6455 5.3).
+
+    Args:
+        payload: Frame payload bytes (unmasked)
+        opcode: Frame opcode
+        mask_key: Optional 4-byte key (random if not given)
+        flags: FIN and RSV1-3 bits as recorded (default: FIN only)
+
+    Returns:
+        Encoded frame as bytes
+    """
+    if mask_key is None:
+        mask_key = os.urandom(4)
+
+    frame = bytearray()
+    frame.append(flags | opcode)
+
+    payload_len = len(payload)
+    if payload_len < 126:
+        frame.append(0x80 | payload_len)
+    elif payload_len < 65536:
+        frame.append(0x80 | 126)
+        frame.extend(struct.pack('>H', payload_len))
+    else:
+        frame.append(0x80 | 127)
+        frame.extend(struct.pack('>Q', payload_len))
+
+    frame.extend(mask_key)
+    # XOR masking is symmetric, so the server's unmask masks too
+    frame.extend(unmask_payload(payload, mask_key))
+    return bytes(frame)
+
+
+def load_events(path, copies, speed):
+    """
+    Build the replay schedule.
+
+    Returns:
+        Sorted list of (due_seconds, seq, client_key, kind, flags, payload)
+    """
+    events = []
+    seq = 0
+    for conn_id, offset, kind, flags, payload in read_recording(path):
+        due = offset / speed if speed > 0 else 0.0
+        for copy in range(copies):
+            # seq keeps per-connection order stable when times are equal
+            events.append((due, seq, (copy, conn_id), kind, flags, payload))
+            seq += 1
+    events.sort()
+    return events
+
+
+class VirtualClient:
+    """One replayed WebSocket connection."""
+
+    def __init__(self, key):
+        self.key = key
+        self.sock = None
+        self.outbox = bytearray()
+        self.pending = []       # frames due before the handshake finished
+        self.handshake_buf = b''
+        self.open = False
+        self.closing = False
+        self.bytes_received = 0
+
+
+def run_replay(args):
+    """Replay a recording against a live server and print a summary."""
+    events = load_events(args.recording, args.copies, args.speed)
+    if not events:
+        print("[-] Recording is empty")
+        return
+
+    upgrade = build_upgrade_request(args.host, args.port)
+    selector = selectors.DefaultSelector()
+    clients = {}
+    stats = {'connected': 0, 'failed': 0, 'frames': 0, 'received': 0}
+
+    def update_interest(client):
+        mask = selectors.EVENT_READ
+        if client.outbox:
+            mask |= selectors.EVENT_WRITE
+        selector.modify(client.sock, mask, client)
+
+    def finish(client):
+        if client.sock is not None:
+            selector.unregister(client.sock)
+            client.sock.close()
+            client.sock = None
+        stats['received'] += client.bytes_received
+        clients.pop(client.key, None)
+
+    def queue_frame(client, opcode, flags, payload):
+        client.outbox.extend(encode_client_frame(payload, opcode, flags=flags))
+        stats['frames'] += 1
+        update_interest(client)
+
+    print(f"[*] Replaying {len(events)} events from {args.recording} "
+          f"(copies={args.copies}, speed={args.speed or 'max'})")
+
+    start = time.monotonic()
+    last_activity = start
+    index = 0
+    while index < len(events) or clients:
+        now = time.monotonic() - start
+
+        # Recording ended with sessions still open (no CLOSE): once the
+        # schedule is done and the server has gone quiet, close them
+        if index >= len(events) and time.monotonic() - last_activity > args.idle_timeout:
+            print(f"[*] Closing {len(clients)} client(s) left open by the recording")
+            for client in list(clients.values()):
+                finish(client)
+            break
+
+        # Fire every event that is due
+        while index < len(events) and events[index][0] <= now:
+            _, _, key, kind, flags, payload = events[index]
+            index += 1
+            last_activity = time.monotonic()
+
+            if kind == KIND_OPEN:
+                client = VirtualClient(key)
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                sock.setblocking(False)
+                sock.connect_ex((args.host, args.port))
+                client.sock = sock
+                client.outbox.extend(upgrade)
+                clients[key] = client
+                selector.register(sock, selectors.EVENT_READ | selectors.EVENT_WRITE, client)
+                continue
+
+            client = clients.get(key)
+            if client is None:
+                # Connection failed earlier, or recording started mid-session
+                continue
+
+            if kind == KIND_CLOSE:
+                client.closing = True
+                if not client.outbox and client.open:
+                    finish(client)
+            elif client.open:
+                queue_frame(client, kind, flags, payload)
+            else:
+                client.pending.append((kind, flags, payload))
+
+        # Wait for I/O, but never past the next due event
+        if index < len(events):
+            timeout = max(0.0, events[index][0] - (time.monotonic() - start))
+        else:
+            timeout = 1.0
+        if not clients:
+            time.sleep(timeout)
+            continue
+
+        for selector_key, mask in selector.select(timeout):
+            last_activity = time.monotonic()
+            client = selector_key.data
+            try:
+                if mask & selectors.EVENT_READ:
+                    data = client.sock.recv(65536)
+                    if not data:
+                        finish(client)
+                        continue
+                    if client.open:
+                        client.bytes_received += len(data)
+                    else:
+                        client.handshake_buf += data
+                        if b'\r\n\r\n' in client.handshake_buf:
+                            head, _, rest = client.handshake_buf.partition(b'\r\n\r\n')
+                            if b' 101 ' not in head.split(b'\r\n', 1)[0]:
+                                stats['failed'] += 1
+                                finish(client)
+                                continue
+                            client.open = True
+                            client.bytes_received += len(rest)
+                            stats['connected'] += 1
+                            for opcode, flags, payload in client.pending:
+                                queue_frame(client, opcode, flags, payload)
+                            client.pending = []
+
+                if mask & selectors.EVENT_WRITE and client.outbox:
+                    sent = client.sock.send(client.outbox)
+                    del client.outbox[:sent]
+
+                if client.sock is not None:
+                    if client.closing and client.open and not client.outbox:
+                        finish(client)
+                    else:
+                        update_interest(client)
+
+            except OSError as e:
+                if not client.open:
+                    stats['failed'] += 1
+                print(f"[-] Client {client.key}: {e}")
+                finish(client)
+
+    elapsed = time.monotonic() - start
+    print(f"[*] Done in {elapsed:.2f}s: {stats['connected']} connected, "
+          f"{stats['failed']} failed, {stats['frames']} frames sent "
+          f"({stats['frames'] / elapsed if elapsed else 0:.0f}/s), "
+          f"{stats['received']} bytes received")
+
+
+# --- pcap export -----------------------------------------------------------
+
+PCAP_SNAPLEN = 65535
+PCAP_GLOBAL_HEADER = struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, PCAP_SNAPLEN, 0)
+LINKTYPE_NULL = 0  # BSD loopback: 4-byte address family, then IPv4
+
+# Largest TCP payload per synthesized segment (Ethernet-sized, like a real
+# capture); keeps every packet well under the IPv4 length and snaplen limits
+MSS = 1460
+
+
+def checksum(data):
+    """Internet checksum (RFC 1071)."""
+    if len(data) % 2:
+        data += b'\0'
+    total = sum(struct.unpack('!%dH' % (len(data) // 2), data))
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+
+class PcapFlow:
+    """Synthesizes the TCP segments of one client <-> server connection."""
+
+    def __init__(self, client_port, server_port, ip='127.0.0.1'):
+        self.ip = socket.inet_aton(ip)
+        self.ports = {'c': client_port, 's': server_port}
+        self.seq = {'c': 1000, 's': 5000}
+        self.ip_id = 0
+
+    def segment(self, side, flags, payload=b''):
+        """Build one IPv4+TCP packet from side 'c' (client) or 's' (server)."""
+        other = 's' if side == 'c' else 'c'
+        ack = self.seq[other] if flags & 0x10 else 0
+
+        tcp = struct.pack('!HHLLBBHHH', self.ports[side], self.ports[other],
+                          self.seq[side], ack, 5 << 4, flags, 65535, 0, 0)
+        pseudo = struct.pack('!4s4sBBH', self.ip, self.ip, 0,
+                             socket.IPPROTO_TCP, len(tcp) + len(payload))
+        tcp_sum = checksum(pseudo + tcp + payload)
+        tcp = tcp[:16] + struct.pack('!H', tcp_sum) + tcp[18:]
+
+        self.ip_id = (self.ip_id + 1) & 0xFFFF
+        ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(tcp) + len(payload),
+                         self.ip_id, 0x4000, 64, socket.IPPROTO_TCP, 0,
+                         self.ip, self.ip)
+        ip = ip[:10] + struct.pack('!H', checksum(ip)) + ip[12:]
+
+        # SYN and FIN consume one sequence number
+        self.seq[side] = (self.seq[side] + len(payload) + (1 if flags & 0x03 else 0)) & 0xFFFFFFFF
+        return ip + tcp + payload
+
+    def send(self, side, data):
+        """Split data into MSS-sized ACK segments (PSH on the last one)."""
+        packets = []
+        for start in range(0, len(data), MSS):
+            last = start + MSS >= len(data)
+            packets.append(self.segment(side, 0x18 if last else 0x10, data[start:start + MSS]))
+        return packets
+
+
+def export_pcap(args):
+    """Write the recorded conversation as a pcap file."""
+    flows = {}
+    count = 0
+    server_port = args.port
+    accept_hash = hashlib.sha1((HANDSHAKE_KEY + WEBSOCKET_GUID).encode()).digest()
+    accept_key = base64.b64encode(accept_hash).decode()
+    upgrade_response = (
+        "HTTP/1.1 101 Switching Protocols\r\n"
+        "Upgrade: websocket\r\n"
+        "Connection: Upgrade\r\n"
+        f"Sec-WebSocket-Accept: {accept_key}\r\n"
+        "\r\n"
+    ).encode()
+    upgrade = build_upgrade_request('127.0.0.1', server_port)
+    base_time = time.time()
+
+    with open(args.output, 'wb') as out:
+        out.write(PCAP_GLOBAL_HEADER)
+
+        def write_packet(offset, packet):
+            nonlocal count
+            ts = base_time + offset
+            frame = struct.pack('<I', socket.AF_INET) + packet
+            out.write(struct.pack('<IIII', int(ts), int((ts % 1) * 1e6),
+                                  len(frame), len(frame)))
+            out.write(frame)
+            count += 1
+
+        for conn_id, offset, kind, flags, payload in read_recording(args.recording):
+            if kind == KIND_OPEN:
+                flow = PcapFlow(40000 + conn_id % 20000, server_port)
+                flows[conn_id] = flow
+                for side, flags in (('c', 0x02), ('s', 0x12), ('c', 0x10)):
+                    write_packet(offset, flow.segment(side, flags))
+                for side, data in (('c', upgrade), ('s', upgrade_response)):
+                    for packet in flow.send(side, data):
+                        write_packet(offset, packet)
+                continue
+
+            flow = flows.get(conn_id)
+            if flow is None:
+                continue
+
+            if kind == KIND_CLOSE:
+                write_packet(offset, flow.segment('c', 0x11))
+                write_packet(offset, flow.segment('s', 0x11))
+                write_packet(offset, flow.segment('c', 0x10))
+                del flows[conn_id]
+            else:
+                # Deterministic mask so repeated exports are identical
+                mask_key = struct.pack('>I', conn_id)
+                data = encode_client_frame(payload, kind, mask_key, flags)
+                for packet in flow.send('c', data):
+                    write_packet(offset, packet)
+                write_packet(offset, flow.segment('s', 0x10))
+
+    print(f"[*] Wrote {count} packets to {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded chat traffic")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help="replay against a server")
+    run.add_argument('recording')
+    run.add_argument('--host', default='127.0.0.1')
+    run.add_argument('--port', type=int, default=10000)
+    run.add_argument('--speed', type=float, default=1.0,
+                     help="time scale: 1 = real time, 10 = 10x, 0 = as fast as possible")
+    run.add_argument('--copies', type=int, default=1,
+                     help="virtual clients per recorded connection")
+    run.add_argument('--idle-timeout', type=float, default=DEFAULT_IDLE_TIMEOUT,
+                     help="after the last event, close clients once the server "
+                          "has been silent this many seconds")
+
+    pcap = commands.add_parser('pcap', help="export the recording as a pcap file")
+    pcap.add_argument('recording')
+    pcap.add_argument('output')
+    pcap.add_argument('--port', type=int, default=10000)
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run_replay(args)
+    else:
+        export_pcap(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,11 @@
 כולל: הוספה, הסרה, ושידור הודעות לכולם
 """
 
-import threading
 from websocket_handler import send_message
+from profiler import TimedLock
 
-# Thread-safe client storage
-clients_lock = threading.Lock()
+# Thread-safe client storage (TimedLock reports wait times to the profiler)
+clients_lock = TimedLock("clients_lock")
 connected_clients = {}  # {socket: {"username": str}}
 
 
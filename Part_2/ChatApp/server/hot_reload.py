@@ -0,0 +1,234 @@
+"""
+הפעלה מחדש ללא ניתוק - Zero-downtime restart
+מעביר את socket ההאזנה ואת כל חיבורי ה-WebSocket הפעילים לתהליך שרת חדש
+דרך socketpair שעובר בירושה לתהליך החדש, עם SCM_RIGHTS (Linux/macOS בלבד)
+"""
+
+import array
+import json
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import threading
+
+# Graceful reload needs Unix sockets, fd passing and SIGHUP
+RELOAD_SUPPORTED = (
+    hasattr(socket, 'AF_UNIX')
+    and hasattr(socket, 'SCM_RIGHTS')
+    and hasattr(signal, 'SIGHUP')
+)
+
+# Max file descriptors per sendmsg (Linux SCM_MAX_FD is 253)
+FDS_PER_BATCH = 200
+
+# Seconds to wait for the new process to acknowledge each batch
+SUCCESSOR_TIMEOUT = 10.0
+
+
+# Set by the SIGHUP handler; the main loop acts on it between accepts
+_reload_requested = threading.Event()
+
+# Socket pair used with signal.set_wakeup_fd to wake the accept loop
+_wakeup_reader = None
+_wakeup_writer = None
+
+
+def _on_sighup(signum, frame):
+    # Only set a flag: the main loop runs the reload at a safe point
+    _reload_requested.set()
+
+
+def install_reload_signal():
+    """
+    Make SIGHUP request a graceful reload.
+
+    Returns:
+        A socket that becomes readable when a signal arrives (register it
+        next to the listening socket), or None where unsupported
+    """
+    global _wakeup_reader, _wakeup_writer
+
+    if not RELOAD_SUPPORTED:
+        return None
+
+    if _wakeup_reader is None:
+        _wakeup_reader, _wakeup_writer = socket.socketpair()
+        _wakeup_reader.setblocking(False)
+        _wakeup_writer.setblocking(False)
+        signal.set_wakeup_fd(_wakeup_writer.fileno())
+
+    signal.signal(signal.SIGHUP, _on_sighup)
+    return _wakeup_reader
+
+
+def take_reload_request():
+    """
+    Drain the wakeup socket and consume a pending reload request.
+
+    Returns:
+        True if SIGHUP arrived since the last call
+    """
+    if _wakeup_reader is not None:
+        try:
+            while _wakeup_reader.recv(512):
+                pass
+        except BlockingIOError:
+            pass
+
+    if _reload_requested.is_set():
+        _reload_requested.clear()
+        return True
+    return False
+
+
+def ignore_reload_signal():
+    """Ignore SIGHUP while a reload is already in progress."""
+    if RELOAD_SUPPORTED:
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+
+def successor_args(control_fd):
+    """Command line for the new process: ours, with --takeover FD."""
+    args = []
+    skip_value = False
+    for arg in sys.argv[1:]:
+        if skip_value:
+            skip_value = False
+        elif arg == '--takeover':
+            skip_value = True
+        elif not arg.startswith('--takeover='):
+            args.append(arg)
+
+    # Re-run the same entry script (run.py or server.py) with fresh code
+    return [sys.executable, sys.argv[0]] + args + ['--takeover', str(control_fd)]
+
+
+def spawn_successor():
+    """
+    Start a new server process that will take over our sockets.
+
+    The control channel is one end of a socketpair inherited by the child
+    (pass_fds), so no other process can connect to it.
+
+    Returns:
+        Tuple of (control_socket, process). control_socket is the Unix
+        socket connected to the new process.
+    """
+    control, child_end = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        process = subprocess.Popen(
+            successor_args(child_end.fileno()),
+            pass_fds=(child_end.fileno(),)
+        )
+    except Exception:
+        control.close()
+        raise
+    finally:
+        # Only the child keeps its end: if it dies, our reads see EOF
+        child_end.close()
+
+    control.settimeout(SUCCESSOR_TIMEOUT)
+    return control, process
+
+
+def _send_batch(control, entries, fds, done):
+    """Send one batch of metadata + fds and wait for the receiver's ack."""
+    body = json.dumps({'entries': entries, 'done': done}).encode('utf-8')
+    data = struct.pack('>I', len(body)) + body
+    ancillary = [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', fds))]
+    control.sendmsg([data], ancillary)
+    if control.recv(1) != b'\x01':
+        raise ConnectionError("successor did not acknowledge batch")
+
+
+def send_handoff(control, server_socket, clients, state=None):
+    """
+    Pass the listening socket and live client connections to the new process.
+
+    Args:
+        control: Unix socket connected to the new process
+        server_socket: Listening TCP socket
+        clients: List of (client_socket, info) where info is a JSON-able
+            dict (e.g. {"username": ...})
+        state: Optional JSON-able dict of server-wide state
+    """
+    entries = [{'kind': 'listener', 'state': state}]
+    fds = [server_socket.fileno()]
+
+    for client_socket, info in clients:
+        entries.append({'kind': 'client', 'info': info})
+        fds.append(client_socket.fileno())
+
+    for start in range(0, len(fds), FDS_PER_BATCH):
+        end = start + FDS_PER_BATCH
+        _send_batch(control, entries[start:end], fds[start:end], end >= len(fds))
+
+
+def _recv_batch(control):
+    """Receive one batch; returns (entries, fds, done)."""
+    fds = array.array('i')
+    max_fds_len = socket.CMSG_SPACE(FDS_PER_BATCH * fds.itemsize)
+    data, ancdata, flags, _ = control.recvmsg(65536, max_fds_len)
+    if not data:
+        raise ConnectionError("previous server closed the control socket")
+    if flags & socket.MSG_CTRUNC:
+        raise ConnectionError("file descriptors were truncated")
+
+    for level, kind, cmsg_data in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            usable = len(cmsg_data) - (len(cmsg_data) % fds.itemsize)
+            fds.frombytes(cmsg_data[:usable])
+
+    # The JSON body may arrive in several reads (no more fds follow)
+    while len(data) < 4 or len(data) < 4 + struct.unpack('>I', data[:4])[0]:
+        chunk = control.recv(65536)
+        if not chunk:
+            raise ConnectionError("control socket closed mid-batch")
+        data += chunk
+
+    body = json.loads(data[4:].decode('utf-8'))
+    control.sendall(b'\x01')
+    return body['entries'], list(fds), body['done']
+
+
+def receive_handoff(control_fd):
+    """
+    Adopt the sockets of the previous server process.
+
+    Args:
+        control_fd: Inherited control socket fd given on the command
+            line (--takeover)
+
+    Returns:
+        Tuple of (server_socket, clients, state) where clients is a list
+        of (client_socket, info) as given to send_handoff
+    """
+    control = socket.socket(fileno=control_fd)
+
+    server_socket = None
+    state = None
+    clients = []
+    try:
+        done = False
+        while not done:
+            entries, fds, done = _recv_batch(control)
+            if len(entries) != len(fds):
+                raise ConnectionError("metadata does not match received fds")
+
+            for entry, fd in zip(entries, fds):
+                # family/type are detected from the fd itself
+                sock = socket.socket(fileno=fd)
+                if entry['kind'] == 'listener':
+                    server_socket = sock
+                    state = entry.get('state')
+                else:
+                    clients.append((sock, entry.get('info') or {}))
+    finally:
+        control.close()
+
+    if server_socket is None:
+        raise ConnectionError("no listening socket received")
+
+    return server_socket, clients, state
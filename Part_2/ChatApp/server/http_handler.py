@@ -4,6 +4,8 @@
 
 import os
 
+import profiler
+
 # Path to client files (relative to this file's directory)
 CLIENT_DIR = os.path.join(os.path.dirname(__file__), '..', 'client')
 
@@ -17,6 +19,10 @@ CONTENT_TYPES = {
     '.ico': 'image/x-icon',
 }
 
+# Admin endpoints (profiler control), only reachable from this machine
+ADMIN_PREFIX = '/admin/'
+ADMIN_ALLOWED_HOSTS = ('127.0.0.1', '::1')
+
 
 def parse_request(data):
     """
@@ -145,6 +151,72 @@ def build_500():
     return build_response(500, 'Internal Server Error', 'text/html; charset=utf-8', body)
 
 
+def split_query(path):
+    """
+    Split "/path?a=1&b=2" into ("/path", {"a": "1", "b": "2"}).
+    """
+    path, _, query = path.partition('?')
+    params = {}
+    for pair in query.split('&'):
+        if '=' in pair:
+            key, value = pair.split('=', 1)
+            params[key] = value
+    return path, params
+
+
+def is_local_client(client_socket):
+    """Check that the request comes from the server machine itself."""
+    try:
+        host = client_socket.getpeername()[0]
+    except (OSError, IndexError):
+        return False
+    return host in ADMIN_ALLOWED_HOSTS
+
+
+def handle_admin(path):
+    """
+    Handle the profiler admin endpoints.
+
+    GET /admin/profile/start?interval=0.01  - start sampling
+    GET /admin/profile/stop                 - stop sampling
+    GET /admin/profile/stacks               - collapsed stacks (flame graph input)
+    GET /admin/profile/locks                - per-function lock wait times
+
+    Args:
+        path: URL path including query string
+
+    Returns:
+        HTTP response as bytes
+    """
+    path, params = split_query(path)
+    text_plain = 'text/plain; charset=utf-8'
+
+    if path == '/admin/profile/start':
+        try:
+            # Rejects negative, nan/inf and intervals above profiler.MAX_INTERVAL
+            started = profiler.start(params.get('interval', profiler.DEFAULT_INTERVAL))
+        except ValueError:
+            body = b"interval must be a number of seconds\n"
+            return build_response(400, 'Bad Request', text_plain, body)
+        body = b"started\n" if started else b"already running\n"
+        return build_response(200, 'OK', text_plain, body)
+
+    if path == '/admin/profile/stop':
+        stopped = profiler.stop()
+        body = b"stopped\n" if stopped else b"not running\n"
+        return build_response(200, 'OK', text_plain, body)
+
+    if path == '/admin/profile/stacks':
+        body = profiler.collapsed_stacks().encode('utf-8')
+        return build_response(200, 'OK', text_plain, body)
+
+    if path == '/admin/profile/locks':
+        body = profiler.lock_report().encode('utf-8')
+        return build_response(200, 'OK', text_plain, body)
+
+    return build_404()
+
+
 def is_websocket_upgrade(request):
     """
     Check if this is a WebSocket upgrade request.
@@ -192,6 +264,15 @@ def handle_http(client_socket, data):
         # Don't send HTTP response - let WebSocket handler take over
         return request
 
+    # Admin endpoints - hidden (404) from remote clients
+    if request['path'].startswith(ADMIN_PREFIX):
+        if is_local_client(client_socket):
+            response = handle_admin(request['path'])
+        else:
+            response = build_404()
+        client_socket.sendall(response)
+        return request
+
     # Serve static file
     response = serve_static_file(request['path'])
     client_socket.sendall(response)
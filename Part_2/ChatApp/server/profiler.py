@@ -0,0 +1,235 @@
+"""
+פרופיילר דגימה לשרת - Sampling profiler
+דוגם את מחסניות כל ה-threads (sys._current_frames) ומודד זמני המתנה למנעולים
+פלט: collapsed stacks לבניית flame graph
+"""
+
+import math
+import os
+import sys
+import threading
+import time
+
+DEFAULT_INTERVAL = 0.01  # seconds between samples (100 Hz)
+MIN_INTERVAL = 0.001
+MAX_INTERVAL = 10.0
+
+# Serializes start()/stop(), held across spawning and joining the sampler
+_control_lock = threading.Lock()
+
+# Profiler state (guarded by _state_lock)
+_state_lock = threading.Lock()
+_sampler_thread = None
+_stop_event = threading.Event()
+_running = False  # read without the lock on the hot path (TimedLock)
+_stack_counts = {}  # {"file:func;file:func:line": samples}
+_lock_waits = {}    # {(lock_name, "file:func"): [count, total_s, max_s]}
+_sample_count = 0
+_started_at = None
+_duration = 0.0
+
+
+def _frame_label(frame, with_line=False):
+    """Format a frame as 'file.py:function' (plus ':line' for the leaf)."""
+    code = frame.f_code
+    label = f"{os.path.basename(code.co_filename)}:{code.co_name}"
+    if with_line:
+        label += f":{frame.f_lineno}"
+    return label
+
+
+def _collapse(frame):
+    """Build a root-first 'a;b;c' stack string from a leaf frame."""
+    labels = [_frame_label(frame, with_line=True)]
+    frame = frame.f_back
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return ";".join(labels)
+
+
+def _sample_loop(interval):
+    """Sampler thread: snapshot every other thread's stack each interval."""
+    global _sample_count
+    own_id = threading.get_ident()
+
+    while not _stop_event.wait(interval):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        frames = sys._current_frames()
+        stacks = []
+        for thread_id, frame in frames.items():
+            if thread_id == own_id:
+                continue
+            thread_name = names.get(thread_id, "thread")
+            # Group handler threads together regardless of their number
+            if thread_name.startswith("Thread-"):
+                thread_name = "handler"
+            stacks.append(f"{thread_name};{_collapse(frame)}")
+        del frames
+
+        with _state_lock:
+            for stack in stacks:
+                _stack_counts[stack] = _stack_counts.get(stack, 0) + 1
+            _sample_count += 1
+
+
+def start(interval=DEFAULT_INTERVAL):
+    """
+    Start sampling (clears results of the previous run).
+
+    Args:
+        interval: Seconds between samples (below MIN_INTERVAL is raised
+            to MIN_INTERVAL)
+
+    Returns:
+        False if the profiler was already running
+
+    Raises:
+        ValueError: If interval is negative, not finite, or above MAX_INTERVAL
+    """
+    global _sampler_thread, _running, _sample_count, _started_at, _duration
+
+    interval = float(interval)
+    if not math.isfinite(interval) or not 0 <= interval <= MAX_INTERVAL:
+        raise ValueError(f"interval must be between 0 and {MAX_INTERVAL} s")
+    interval = max(interval, MIN_INTERVAL)
+
+    with _control_lock:
+        with _state_lock:
+            if _running:
+                return False
+            _stack_counts.clear()
+            _lock_waits.clear()
+            _sample_count = 0
+            _duration = 0.0
+            _started_at = time.monotonic()
+            _stop_event.clear()
+            _running = True
+
+        _sampler_thread = threading.Thread(
+            target=_sample_loop,
+            args=(interval,),
+            name="profiler-sampler"
+        )
+        _sampler_thread.daemon = True
+        _sampler_thread.start()
+
+    print(f"[PROF] Sampling started (interval {interval * 1000:.1f} ms)")
+    return True
+
+
+def stop():
+    """
+    Stop sampling; collected results stay available until the next start.
+
+    Returns:
+        False if the profiler was not running
+    """
+    global _sampler_thread, _running, _duration
+
+    # A concurrent start() waits until our sampler has exited, so the
+    # stop event can't hit the sampler it starts next
+    with _control_lock:
+        with _state_lock:
+            if not _running:
+                return False
+            _running = False
+            _duration = time.monotonic() - _started_at
+
+        _stop_event.set()
+        if _sampler_thread is not None:
+            _sampler_thread.join()
+            _sampler_thread = None
+
+    print(f"[PROF] Sampling stopped after {_duration:.1f}s ({_sample_count} samples)")
+    return True
+
+
+def is_running():
+    """Return True while the sampler is active."""
+    return _running
+
+
+def collapsed_stacks():
+    """
+    Export samples in collapsed-stack format ("frame;frame;frame count"),
+    one stack per line, as consumed by flamegraph.pl / speedscope.
+
+    Returns:
+        Text string
+    """
+    with _state_lock:
+        items = sorted(_stack_counts.items(), key=lambda kv: kv[1], reverse=True)
+    return "".join(f"{stack} {count}\n" for stack, count in items)
+
+
+def lock_report():
+    """
+    Per-function lock wait times, sorted by total time waited.
+
+    Returns:
+        Text table string
+    """
+    with _state_lock:
+        rows = sorted(_lock_waits.items(), key=lambda kv: kv[1][1], reverse=True)
+        duration = _duration if not _running else time.monotonic() - _started_at
+        samples = _sample_count
+
+    lines = [
+        f"# running={_running} duration={duration:.3f}s samples={samples}",
+        "# lock\tfunction\tacquires\ttotal_wait_ms\tmax_wait_ms",
+    ]
+    for (lock_name, function), (count, total, longest) in rows:
+        lines.append(
+            f"{lock_name}\t{function}\t{count}\t{total * 1000:.3f}\t{longest * 1000:.3f}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def _record_lock_wait(lock_name, function, waited):
+    with _state_lock:
+        stats = _lock_waits.get((lock_name, function))
+        if stats is None:
+            _lock_waits[(lock_name, function)] = [1, waited, waited]
+        else:
+            stats[0] += 1
+            stats[1] += waited
+            if waited > stats[2]:
+                stats[2] = waited
+
+
+class TimedLock:
+    """
+    Drop-in replacement for threading.Lock that records how long each
+    calling function waited to acquire it while the profiler is running.
+    Costs one flag check per acquire when the profiler is off.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+
+    def acquire(self, blocking=True, timeout=-1, _depth=1):
+        if not _running:
+            return self._lock.acquire(blocking, timeout)
+
+        start_time = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        waited = time.perf_counter() - start_time
+        _record_lock_wait(self.name, _frame_label(sys._getframe(_depth)), waited)
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        # Skip this frame so the wait is charged to the `with` statement's function
+        self.acquire(_depth=2)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
@@ -0,0 +1,225 @@
+"""
+הקלטת תעבורת WebSocket נכנסת - Traffic recorder
+שומר כל frame נכנס (כפי שפוענח ב-decode_frame) עם זמן ומזהה חיבור לקובץ בינארי
+לשחזור עומסים עם replay.py
+"""
+
+import struct
+import threading
+import time
+
+# File layout: MAGIC, then records of RECORD_HEADER + payload
+MAGIC = b'CHATREC2'
+RECORD_HEADER = struct.Struct('>IdBBI')  # conn_id, seconds since start, kind, flags, payload length
+
+# Version 1 files (no flags byte; every frame was stored as if FIN were set)
+MAGIC_V1 = b'CHATREC1'
+RECORD_HEADER_V1 = struct.Struct('>IdBI')
+
+# Frame flags: the FIN and RSV1-3 bits of the frame's first byte
+FLAG_FIN = 0x80
+
+# Record kinds besides WebSocket opcodes (which are 0x0-0xF)
+KIND_OPEN = 0xFF   # connection upgraded to WebSocket
+KIND_CLOSE = 0xFE  # connection ended
+
+# Recorder state (guarded by _record_lock)
+_record_lock = threading.Lock()
+_file = None
+_path = None
+_start_time = None
+_conn_ids = {}  # {socket: conn_id}
+_next_conn_id = 1
+_recording = False  # read without the lock on the hot path
+
+
+def start_recording(path):
+    """
+    Start recording inbound WebSocket traffic to a file.
+
+    Args:
+        path: Output file path (overwritten)
+    """
+    global _file, _path, _start_time, _next_conn_id, _recording
+
+    with _record_lock:
+        if _recording:
+            return
+        _file = open(path, 'wb')
+        _file.write(MAGIC)
+        _path = path
+        _start_time = time.monotonic()
+        _conn_ids.clear()
+        _next_conn_id = 1
+        _recording = True
+
+    print(f"[REC] Recording inbound traffic to {path}")
+
+
+def stop_recording():
+    """
+    Stop recording and close the file.
+    Connections still open get a CLOSE record, so every recorded
+    session ends and replays of the file terminate.
+    """
+    global _file, _recording
+
+    with _record_lock:
+        if not _recording:
+            return
+        offset = time.monotonic() - _start_time
+        for conn_id in _conn_ids.values():
+            _file.write(RECORD_HEADER.pack(conn_id, offset, KIND_CLOSE, 0, 0))
+        _recording = False
+        _file.close()
+        _file = None
+        _conn_ids.clear()
+
+    print("[REC] Recording stopped")
+
+
+def suspend_recording():
+    """
+    Stop writing without ending the open sessions (graceful reload): the
+    next server process continues the same file with resume_recording().
+
+    Returns:
+        State dict to pass to resume_recording(), or None if not recording
+    """
+    global _file, _recording
+
+    with _record_lock:
+        if not _recording:
+            return None
+        state = {
+            'path': _path,
+            'offset': time.monotonic() - _start_time,
+            'next_conn_id': _next_conn_id,
+        }
+        _recording = False
+        _file.close()
+        _file = None
+        _conn_ids.clear()
+
+    print("[REC] Recording suspended for handoff")
+    return state
+
+
+def resume_recording(state, connections):
+    """
+    Continue a recording suspended by suspend_recording(), keeping its
+    time base and connection ids.
+
+    Args:
+        state: Dict returned by suspend_recording()
+        connections: {socket: conn_id} for sessions that were being recorded
+    """
+    global _file, _path, _start_time, _next_conn_id, _recording
+
+    # A server from before a format change may have started the file
+    with open(state['path'], 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            print(f"[REC] {state['path']} uses an older format; recording stopped")
+            return
+
+    with _record_lock:
+        if _recording:
+            return
+        _file = open(state['path'], 'ab')
+        _path = state['path']
+        _start_time = time.monotonic() - state['offset']
+        _conn_ids.clear()
+        _conn_ids.update(connections)
+        _next_conn_id = state['next_conn_id']
+        _recording = True
+
+    print(f"[REC] Recording resumed to {state['path']}")
+
+
+def connection_id(client_socket):
+    """Recorder id of a connection, or None if it hasn't been recorded."""
+    with _record_lock:
+        return _conn_ids.get(client_socket)
+
+
+def is_recording():
+    """Return True while traffic is being recorded."""
+    return _recording
+
+
+def _write(client_socket, kind, payload, flags=0):
+    """Append one record; assigns a connection id on first sight."""
+    global _next_conn_id
+
+    with _record_lock:
+        if not _recording:
+            return
+
+        conn_id = _conn_ids.get(client_socket)
+        if conn_id is None:
+            conn_id = _next_conn_id
+            _next_conn_id += 1
+            _conn_ids[client_socket] = conn_id
+
+        offset = time.monotonic() - _start_time
+        _file.write(RECORD_HEADER.pack(conn_id, offset, kind, flags, len(payload)))
+        _file.write(payload)
+
+        if kind == KIND_CLOSE:
+            del _conn_ids[client_socket]
+
+
+def record_open(client_socket):
+    """Record that a connection finished its WebSocket handshake."""
+    if _recording:
+        _write(client_socket, KIND_OPEN, b'')
+
+
+def record_frame(client_socket, opcode, payload, flags=FLAG_FIN):
+    """Record one decoded (unmasked) inbound frame with its FIN/RSV flags."""
+    if _recording:
+        _write(client_socket, opcode, payload, flags)
+
+
+def record_close(client_socket):
+    """Record that a connection ended."""
+    if _recording:
+        _write(client_socket, KIND_CLOSE, b'')
+
+
+def read_recording(path):
+    """
+    Iterate over the records in a recording file.
+
+    Args:
+        path: Recording file path
+
+    Yields:
+        Tuples of (conn_id, offset_seconds, kind, flags, payload);
+        flags is 0 for KIND_OPEN / KIND_CLOSE
+    """
+    with open(path, 'rb') as f:
+        magic = f.read(len(MAGIC))
+        if magic == MAGIC:
+            record_header = RECORD_HEADER
+        elif magic == MAGIC_V1:
+            record_header = RECORD_HEADER_V1
+        else:
+            raise ValueError(f"{path} is not a chat recording")
+
+        while True:
+            header = f.read(record_header.size)
+            if not header:
+                return
+            if len(header) < record_header.size:
+                # Truncated tail (server killed mid-write) - stop here
+                return
+            if record_header is RECORD_HEADER:
+                conn_id, offset, kind, flags, length = record_header.unpack(header)
+            else:
+                conn_id, offset, kind, length = record_header.unpack(header)
+                flags = 0 if kind in (KIND_OPEN, KIND_CLOSE) else FLAG_FIN
+            payload = f.read(length)
+            if len(payload) < length:
+                return
+            yield conn_id, offset, kind, flags, payload
@@ -6,8 +6,11 @@ Group_AN - פרויקט גמר ברשתות תקשורת מחשבים
 משתמש בספריות מובנות בלבד: socket, threading, hashlib, base64, struct
 """
 
+import argparse
+import selectors
 import socket
 import threading
+import time
 
 from http_handler import handle_http, is_websocket_upgrade
 from websocket_handler import handle_websocket_connection
@@ -17,12 +20,39 @@ from client_manager import (
     broadcast,
     broadcast_system_message,
     broadcast_user_list,
-    get_client_count
+    get_client_count,
+    get_username
+)
+from recorder import (
+    start_recording,
+    stop_recording,
+    suspend_recording,
+    resume_recording,
+    connection_id
+)
+from hot_reload import (
+    RELOAD_SUPPORTED,
+    install_reload_signal,
+    take_reload_request,
+    ignore_reload_signal,
+    spawn_successor,
+    send_handoff,
+    receive_handoff
 )
 
 HOST = '0.0.0.0'  # Listen on all interfaces
 PORT = 10000
 
+# Seconds to wait for handler threads to park during a graceful reload
+HANDOFF_TIMEOUT = 5.0
+
+# Set during a graceful reload: WebSocket sessions stop between frames
+handoff_event = threading.Event()
+
+# Sessions that stopped for handoff (socket still open)
+parked_lock = threading.Lock()
+parked_sockets = []
+
 
 def get_local_ip():
     """Get the local IP address of this machine."""
@@ -80,11 +110,49 @@ def on_close(client_socket):
         broadcast_user_list()
 
 
-def handle_client(client_socket, address):
-    """Handle a single client connection."""
-    print(f"[+] New connection from {address}")
+def run_websocket_session(client_socket, request, handshake=True):
+    """
+    Run a WebSocket session until it closes or is parked for handoff.
+
+    Returns:
+        True if the session was parked (socket must stay open)
+    """
+    parked = handle_websocket_connection(
+        client_socket,
+        request,
+        on_message=on_message,
+        on_close=on_close,
+        stop_event=handoff_event if RELOAD_SUPPORTED else None,
+        handshake=handshake
+    )
+    if parked:
+        with parked_lock:
+            parked_sockets.append(client_socket)
+    return parked
+
+
+def handle_client(client_socket, address, resumed=False):
+    """
+    Handle a single client connection.
+
+    Args:
+        client_socket: Client socket
+        address: Client address
+        resumed: True for an already-upgraded WebSocket connection
+            received from a previous server process
+    """
+    parked = False
+
+    if resumed:
+        print(f"[+] Resumed connection from {address}")
+    else:
+        print(f"[+] New connection from {address}")
 
     try:
+        if resumed:
+            parked = run_websocket_session(client_socket, None, handshake=False)
+            return
+
         # Read raw data from client
         data = client_socket.recv(4096)
         if not data:
@@ -96,28 +164,114 @@ def handle_client(client_socket, address):
         # If this is a WebSocket upgrade request, hand off to WebSocket handler
         if request and is_websocket_upgrade(request):
             print(f"[WS] WebSocket upgrade from {address}")
-            # Handle WebSocket connection (blocking until closed)
-            handle_websocket_connection(
-                client_socket,
-                request,
-                on_message=on_message,
-                on_close=on_close
-            )
-            # Don't close socket here - it's handled in the WebSocket handler
+            # Handle WebSocket connection (blocking until closed or parked)
+            parked = run_websocket_session(client_socket, request)
             return
 
     except Exception as e:
         print(f"[-] Error handling {address}: {e}")
     finally:
-        try:
-            client_socket.close()
-        except:
-            pass
-        print(f"[-] Connection closed: {address}")
+        if parked:
+            print(f"[*] Connection parked for handoff: {address}")
+        else:
+            try:
+                client_socket.close()
+            except:
+                pass
+            print(f"[-] Connection closed: {address}")
+
+
+def start_client_thread(client_socket, address, client_threads, resumed=False):
+    """Start a daemon handler thread and remember it for graceful reload."""
+    client_thread = threading.Thread(
+        target=handle_client,
+        args=(client_socket, address, resumed)
+    )
+    client_thread.daemon = True  # Thread dies when main thread dies
+    client_thread.start()
+
+    # Forget finished threads so the list doesn't grow forever
+    client_threads[:] = [t for t in client_threads if t.is_alive()]
+    client_threads.append(client_thread)
+
+
+def peer_address(client_socket):
+    """Best-effort remote address of a socket (for log messages)."""
+    try:
+        return client_socket.getpeername()
+    except OSError:
+        return None
 
 
-def main():
-    """Main server loop - accepts connections and spawns handler threads."""
+def graceful_reload(server, client_threads):
+    """
+    Hand the listening socket and every live WebSocket session to a
+    freshly started server process (triggered by SIGHUP).
+
+    Sessions that have not parked within HANDOFF_TIMEOUT (e.g. a client
+    stalled in the middle of a frame) are dropped when this process
+    exits: they get no close frame and no "left" broadcast.
+
+    Args:
+        server: Listening TCP socket
+        client_threads: Handler threads started by this process
+
+    Returns:
+        True if the new process took over and this one should exit
+    """
+    ignore_reload_signal()
+    print("[*] Reload requested, starting new server process...")
+
+    # Start the successor first: if that fails nothing has been disturbed
+    try:
+        control, successor = spawn_successor()
+    except Exception as e:
+        print(f"[-] Reload aborted, could not start new server: {e}")
+        install_reload_signal()
+        return False
+
+    # Park every WebSocket session between frames
+    handoff_event.set()
+    deadline = time.monotonic() + HANDOFF_TIMEOUT
+    for t in client_threads:
+        t.join(max(0.0, deadline - time.monotonic()))
+
+    with parked_lock:
+        sockets = list(parked_sockets)
+        parked_sockets.clear()
+    record_ids = {sock: connection_id(sock) for sock in sockets}
+    clients = [
+        (sock, {'username': get_username(sock), 'record_id': record_ids[sock]})
+        for sock in sockets
+    ]
+
+    # The successor appends to the same recording, keeping connection ids
+    recording = suspend_recording()
+
+    try:
+        send_handoff(control, server, clients, {'recording': recording})
+    except Exception as e:
+        print(f"[-] Handoff failed, resuming sessions here: {e}")
+        successor.kill()
+        if recording:
+            resume_recording(recording, {
+                sock: conn_id for sock, conn_id in record_ids.items()
+                if conn_id is not None
+            })
+        handoff_event.clear()
+        for sock in sockets:
+            start_client_thread(sock, peer_address(sock), client_threads, resumed=True)
+        install_reload_signal()
+        return False
+    finally:
+        control.close()
+
+    print(f"[*] Handed off {len(clients)} connection(s) to pid {successor.pid}")
+    return True
+
+
+def create_server_socket():
+    """Create, bind and listen on the server's TCP socket."""
     # Create TCP socket
     server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
@@ -127,31 +281,113 @@ def main():
     # Bind to address and port
     server.bind((HOST, PORT))
 
-    # Start listening (backlog of 5 connections)
-    server.listen(5)
+    # Start listening (OS maximum backlog, so connection bursts such as
+    # replay.py load tests aren't dropped and retried with SYN backoff)
+    server.listen(socket.SOMAXCONN)
+
+    return server
+
+
+def take_over(control_fd, client_threads):
+    """
+    Adopt the listening socket and live sessions of a previous server.
+
+    Returns:
+        Tuple of (server_socket, state) where state is the previous
+        server's handoff state dict
+    """
+    server, clients, state = receive_handoff(control_fd)
+    state = state or {}
+
+    # Continue the previous recording before any session reads a frame
+    if state.get('recording'):
+        resume_recording(state['recording'], {
+            client_socket: info['record_id'] for client_socket, info in clients
+            if info.get('record_id') is not None
+        })
+
+    # Register usernames before any handler thread can broadcast
+    for client_socket, info in clients:
+        if info.get('username'):
+            add_client(client_socket, info['username'])
+
+    for client_socket, _ in clients:
+        start_client_thread(client_socket, peer_address(client_socket),
+                            client_threads, resumed=True)
+
+    print(f"[*] Took over {len(clients)} connection(s) from previous server")
+    return server, state
+
+
+def main():
+    """Main server loop - accepts connections and spawns handler threads."""
+    parser = argparse.ArgumentParser(description="Chat Server")
+    parser.add_argument(
+        '--takeover',
+        metavar='FD',
+        type=int,
+        help="adopt sockets from a reloading server (used internally on SIGHUP)"
+    )
+    parser.add_argument(
+        '--record',
+        metavar='FILE',
+        help="record inbound WebSocket frames to FILE (replay with replay.py)"
+    )
+    args = parser.parse_args()
+
+    client_threads = []
+    state = {}
+
+    if args.takeover is not None:
+        server, state = take_over(args.takeover, client_threads)
+    else:
+        server = create_server_socket()
 
     local_ip = get_local_ip()
     print(f"[*] Chat Server started on {HOST}:{PORT}")
     print(f"[*] Open: http://{local_ip}:{PORT}")
     print("[*] Press Ctrl+C to stop")
+    if RELOAD_SUPPORTED:
+        print("[*] Send SIGHUP to reload without dropping connections")
     print("=" * 40)
 
+    # SIGHUP only sets a flag and wakes the selector; the reload itself
+    # runs here, between accepts
+    # (accepted sockets are still blocking: Python resets them)
+    server.setblocking(False)
+    selector = selectors.DefaultSelector()
+    selector.register(server, selectors.EVENT_READ)
+    wakeup = install_reload_signal()
+    if wakeup is not None:
+        selector.register(wakeup, selectors.EVENT_READ)
+
+    if args.record and not state.get('recording'):
+        start_recording(args.record)
+
     try:
         while True:
-            # Accept new connection
-            client_socket, address = server.accept()
+            ready = selector.select()
+
+            if take_reload_request():
+                if graceful_reload(server, client_threads):
+                    break
+                continue
+
+            if any(key.fileobj is server for key, _ in ready):
+                # Accept new connection
+                try:
+                    client_socket, address = server.accept()
+                except (BlockingIOError, InterruptedError):
+                    continue
 
-            # Handle in new thread
-            client_thread = threading.Thread(
-                target=handle_client,
-                args=(client_socket, address)
-            )
-            client_thread.daemon = True  # Thread dies when main thread dies
-            client_thread.start()
+                # Handle in new thread
+                start_client_thread(client_socket, address, client_threads)
 
     except KeyboardInterrupt:
         print("\n[*] Server shutting down...")
     finally:
+        selector.close()
+        stop_recording()
         server.close()
 
 
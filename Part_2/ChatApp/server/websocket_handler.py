@@ -5,8 +5,11 @@
 
 import hashlib
 import base64
+import select
 import struct
 
+import recorder
+
 # Magic GUID for WebSocket handshake (RFC 6455)
 WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
 
@@ -18,6 +21,9 @@ OPCODE_CLOSE = 0x8
 OPCODE_PING = 0x9
 OPCODE_PONG = 0xA
 
+# How often a parked connection re-checks the stop event (seconds)
+STOP_POLL_INTERVAL = 1.0
+
 
 def perform_handshake(client_socket, request):
     """
@@ -59,6 +65,22 @@ def perform_handshake(client_socket, request):
     return True
 
 
+def recv_exact(client_socket, n):
+    """
+    Read exactly n bytes (a frame may arrive split across TCP segments).
+
+    Returns:
+        The bytes read; shorter than n only if the connection closed
+    """
+    data = b''
+    while len(data) < n:
+        chunk = client_socket.recv(n - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
 def decode_frame(client_socket):
     """
     Decode a WebSocket frame from client.
@@ -69,15 +91,31 @@ def decode_frame(client_socket):
     Returns:
         Tuple of (opcode, payload_data) or (None, None) on error
     """
+    _, opcode, payload = read_frame(client_socket)
+    return opcode, payload
+
+
+def read_frame(client_socket):
+    """
+    Decode a WebSocket frame from client, keeping its header flags.
+
+    Args:
+        client_socket: Client socket to read from
+
+    Returns:
+        Tuple of (flags, opcode, payload_data) where flags holds the FIN
+        and RSV1-3 bits (high nibble of the first byte), or
+        (None, None, None) on error
+    """
     try:
         # Read first 2 bytes (header)
-        header = client_socket.recv(2)
+        header = recv_exact(client_socket, 2)
         if len(header) < 2:
-            return None, None
+            return None, None, None
 
         # Parse first byte: FIN + RSV + opcode
         first_byte = header[0]
-        fin = (first_byte >> 7) & 1
+        flags = first_byte & 0xF0
         opcode = first_byte & 0x0F
 
         # Parse second byte: MASK + payload length
@@ -88,17 +126,17 @@ def decode_frame(client_socket):
         # Handle extended payload length
         if payload_len == 126:
             # Next 2 bytes are length (big-endian)
-            ext_len = client_socket.recv(2)
+            ext_len = recv_exact(client_socket, 2)
             payload_len = struct.unpack('>H', ext_len)[0]
         elif payload_len == 127:
             # Next 8 bytes are length (big-endian)
-            ext_len = client_socket.recv(8)
+            ext_len = recv_exact(client_socket, 8)
             payload_len = struct.unpack('>Q', ext_len)[0]
 
         # Read masking key (4 bytes) if masked
         mask_key = None
         if masked:
-            mask_key = client_socket.recv(4)
+            mask_key = recv_exact(client_socket, 4)
 
         # Read payload data
         payload = b''
@@ -114,11 +152,39 @@ def decode_frame(client_socket):
         if masked and mask_key:
             payload = unmask_payload(payload, mask_key)
 
-        return opcode, payload
+        return flags, opcode, payload
 
     except Exception as e:
         print(f"[-] Error decoding frame: {e}")
-        return None, None
+        return None, None, None
+
+
+def wait_for_frame(client_socket, stop_event):
+    """
+    Block until the socket is readable or stop_event is set.
+    Only called between frames, so a stopped connection never has a
+    partially read frame: unread bytes stay in the kernel buffer and
+    travel with the socket if it is handed to another process.
+
+    Uses poll() rather than select(): select() rejects fds >= 1024,
+    which busy servers and load tests easily reach.
+
+    Args:
+        client_socket: Client socket to wait on
+        stop_event: threading.Event that asks the connection to stop
+
+    Returns:
+        True if data is ready, False if stop_event was set
+    """
+    poller = select.poll()
+    poller.register(client_socket, select.POLLIN | select.POLLPRI)
+    timeout_ms = int(STOP_POLL_INTERVAL * 1000)
+
+    while not stop_event.is_set():
+        # Errors/hangups are reported too; decode_frame then sees EOF
+        if poller.poll(timeout_ms):
+            return not stop_event.is_set()
+    return False
 
 
 def unmask_payload(payload, mask_key):
@@ -205,7 +271,8 @@ def send_close(client_socket, code=1000, reason=""):
         pass  # Connection might already be closed
 
 
-def handle_websocket_connection(client_socket, request, on_message, on_close):
+def handle_websocket_connection(client_socket, request, on_message, on_close,
+                                stop_event=None, handshake=True):
     """
     Handle a WebSocket connection after handshake.
     Reads frames and calls callbacks.
@@ -215,19 +282,37 @@ def handle_websocket_connection(client_socket, request, on_message, on_close):
         request: Parsed HTTP request
         on_message: Callback(socket, message_str) for text messages
         on_close: Callback(socket) when connection closes
+        stop_event: Optional threading.Event; when set, the loop stops
+            between frames and leaves the connection open
+        handshake: False for a connection that is already upgraded
+            (e.g. one received from a previous server process)
+
+    Returns:
+        True if stopped by stop_event (connection still open), else False
     """
     # Perform handshake
-    if not perform_handshake(client_socket, request):
-        return
+    if handshake and not perform_handshake(client_socket, request):
+        return False
+
+    # A resumed session was already opened in the recording
+    if handshake:
+        recorder.record_open(client_socket)
 
+    stopped = False
     try:
         while True:
-            opcode, payload = decode_frame(client_socket)
+            if stop_event is not None and not wait_for_frame(client_socket, stop_event):
+                stopped = True
+                break
+
+            flags, opcode, payload = read_frame(client_socket)
 
             if opcode is None:
                 # Connection error
                 break
 
+            recorder.record_frame(client_socket, opcode, payload, flags)
+
             if opcode == OPCODE_TEXT:
                 # Text message
                 message = payload.decode('utf-8')
@@ -252,4 +337,8 @@ def handle_websocket_connection(client_socket, request, on_message, on_close):
         print(f"[-] WebSocket error: {e}")
 
     finally:
-        on_close(client_socket)
+        if not stopped:
+            recorder.record_close(client_socket)
+            on_close(client_socket)
+
+    return stopped